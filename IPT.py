@@ -8,6 +8,7 @@ M_H_D65 = np.array(
         [0.0000, 0.0000, 0.9184],
     ]
 )
+M_H_D65_inv = np.linalg.inv(M_H_D65)
 
 M_IPT = np.array(
     [
@@ -16,6 +17,7 @@ M_IPT = np.array(
         [0.8056, 0.3572, -1.1628],
     ]
 )
+M_IPT_inv = np.linalg.inv(M_IPT)
 
 def IPT(XYZ):
     XYZ_reshape = XYZ.reshape((-1, 3))
@@ -40,9 +42,9 @@ def IPT(XYZ):
     # IPT[..., 0] = IPT[..., 0] ** 1.0
     
     IPT_reshape = IPT.reshape((-1, 3))
-    LMS_nonlinear = IPT_reshape @ np.linalg.inv(M_IPT).T
+    LMS_nonlinear = IPT_reshape @ M_IPT_inv.T
     LMS = np.sign(LMS_nonlinear) * np.abs(LMS_nonlinear) ** (1 / 0.43)
-    XYZ_reshape = LMS @ np.linalg.inv(M_H_D65).T
+    XYZ_reshape = LMS @ M_H_D65_inv.T
     XYZ = XYZ_reshape.reshape(XYZ.shape)
     
     return XYZ
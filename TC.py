@@ -8,6 +8,7 @@ M_HPE = np.array(
         [0.0, 0.0, 1.0],
     ]
 )
+M_HPE_inv = np.linalg.inv(M_HPE)
 
 
 def img_TC(XYZ, white, p):
@@ -41,7 +42,7 @@ def img_TC(XYZ, white, p):
         RGB_TC[..., i] = RGB_dash_a[..., i] + A_S
     
     RGB_TC_reshape = RGB_TC.reshape((-1, 3))
-    XYZ_TC = RGB_TC_reshape @ np.linalg.inv(M_HPE).T
+    XYZ_TC = RGB_TC_reshape @ M_HPE_inv.T
     XYZ_TC = XYZ_TC.reshape(XYZ.shape)
     return XYZ_TC
     
@@ -1,21 +1,47 @@
+import functools
+
 import numpy as np
-import numexpr as ne
 import cv2
+from scipy import fft as spfft
 
 
-def idl_dist(m, n):
+def idl_dist_sq(m, n):
     """
-    Compute a 2D Euclidean distance map similar to IDL's DIST function.
+    Compute the squared 2D Euclidean distance map of IDL's DIST function.
 
     Parameters:
     m (int): Number of rows in the output matrix.
     n (int): Number of columns in the output matrix.
 
     Returns:
-    numpy.ndarray: A 2D matrix where each element represents the Euclidean distance from the center.
+    numpy.ndarray: A 2D matrix where each element represents the squared Euclidean distance from the center.
     """
     y, x = np.ogrid[:m, :n]
-    return np.sqrt(np.minimum(x, n - 1 - x)**2 + np.minimum(y, m - 1 - y)**2)
+    return (np.minimum(x, n - 1 - x)**2 + np.minimum(y, m - 1 - y)**2).astype(np.float32)
+
+
+@functools.lru_cache(maxsize=8)
+def gaussian_filter_kernel(m, n, sigma):
+    """
+    Compute the normalised frequency response of an IDL DIST-based Gaussian.
+
+    The result only depends on the shape and sigma, so it is cached and
+    returned read-only.
+
+    Parameters:
+    m (int): Number of rows of the (padded) image.
+    n (int): Number of columns of the (padded) image.
+    sigma (float): Width of the Gaussian exp(-(dist / sigma)**2).
+
+    Returns:
+    numpy.ndarray: Real half-spectrum filter, shape (m, n // 2 + 1), with unit DC gain.
+    """
+    kernel = np.exp(-idl_dist_sq(m, n) / np.float32(sigma ** 2))
+    # Both the kernel and the image are real, so the half-spectrum is enough
+    filter_kernel = np.maximum(np.real(spfft.rfft2(kernel, workers=-1)), 0)
+    filter_kernel = filter_kernel / filter_kernel[0, 0]
+    filter_kernel.setflags(write=False)
+    return filter_kernel
 
 
 def blur(img, d):
@@ -47,41 +73,19 @@ def blur(img, d):
     img = img[::z, ::z, :]  # Downsample the image
     # Get the size of the downsampled image
     yDim, xDim, _ = img.shape
-    # Padding with symmetric mirroring
-    Y = np.zeros((2 * yDim, 2 * xDim, 3))
-    # Center
-    Y[yDim//2:yDim//2 + yDim, xDim//2:xDim//2 + xDim, :] = img
-    # Left mirror
-    Y[yDim//2:yDim//2 + yDim, :xDim//2, :] = img[:, :xDim//2, :][:, ::-1, :]
-    # Right mirror
-    Y[yDim//2:yDim//2 + yDim, xDim//2 + xDim:, :] = img[:, xDim//2:xDim, :][:, ::-1, :]
-    # Top mirror
-    Y[:yDim//2, xDim//2:xDim//2 + xDim, :] = img[:yDim//2, :, :][::-1, :, :]
-    # Bottom mirror
-    Y[yDim//2 + yDim:, xDim//2:xDim//2 + xDim, :] = img[yDim//2:, :, :][::-1, :, :]
-    # Top-left corner
-    Y[:yDim//2, :xDim//2, :] = img[:yDim//2, :xDim//2, :][::-1, ::-1, :]
-    # Top-right corner
-    Y[:yDim//2, xDim//2 + xDim:, :] = img[:yDim//2, xDim//2:xDim, :][::-1, ::-1, :]
-    # Bottom-right corner
-    Y[yDim//2 + yDim:, xDim//2 + xDim:, :] = img[yDim//2:, xDim//2:xDim, :][::-1, ::-1, :]
-    # Bottom-left corner
-    Y[yDim//2 + yDim:, :xDim//2, :] = img[yDim//2:, :xDim//2, :][::-1, ::-1, :]
+    # Padding with symmetric mirroring, corners reflected along both axes
+    Y = np.pad(
+        img.astype(np.float32, copy=False),
+        ((yDim//2, yDim - yDim//2), (xDim//2, xDim - xDim//2), (0, 0)),
+        mode="symmetric",
+    )
     # Gaussian Filtering
-    dist_map = idl_dist(Y.shape[0], Y.shape[1])
     Dim = max(xDim, yDim)
-    kernel = np.exp(-1 * (dist_map / (Dim / d)) ** 2)
-    filter_kernel = np.maximum(np.real(np.fft.fft2(kernel)), 0)
-    filter_kernel = filter_kernel / filter_kernel[0, 0]
-    # Apply the filter to each channel
-    white = np.zeros_like(Y)
-    for channel in range(3):
-        white[:, :, channel] = np.maximum(
-            np.real(np.fft.ifft2(np.fft.fft2(Y[:, :, channel]) * filter_kernel)),
-            0
-        )
-    # Crop the padded image
-    white = white[yDim//2:yDim//2 + yDim, xDim//2:xDim//2 + xDim, :]
+    filter_kernel = gaussian_filter_kernel(Y.shape[0], Y.shape[1], Dim / d)
+    # Filter all channels in one batched transform, keeping only the unpadded centre
+    spectrum = spfft.rfft2(Y, axes=(0, 1), workers=-1) * filter_kernel[:, :, np.newaxis]
+    filtered = spfft.irfft2(spectrum, s=Y.shape[:2], axes=(0, 1), workers=-1)
+    white = np.maximum(filtered[yDim//2:yDim//2 + yDim, xDim//2:xDim//2 + xDim, :], 0)
     # Upsampling
     white = cv2.resize(white, (sx, sy), interpolation=cv2.INTER_NEAREST)
     return white
@@ -89,7 +93,9 @@ def blur(img, d):
 
 def bilateral_filter(img):
     img[img < 1e-4] = 1e-4
-    logimg = ne.evaluate("log10(img)")
+    # cv2.bilateralFilter only takes 8U/32F input; keep it float32 and contiguous.
+    # img is the caller's XYZ and is reused afterwards, so it is not used as the log buffer.
+    logimg = np.log10(img, dtype=np.float32)
 
     sigmaColor = 0.35
     if min(img.shape) < 1024:
@@ -101,10 +107,12 @@ def bilateral_filter(img):
     sigmaSpace = 10
     base_layer = cv2.bilateralFilter(logimg, d=-1, sigmaColor=sigmaColor, sigmaSpace=sigmaSpace)
     
-    detail_layer = logimg - base_layer
+    # logimg is not needed after this, reuse its buffer for the detail layer
+    detail_layer = np.subtract(logimg, base_layer, out=logimg)
     detail_layer[detail_layer > 12] = 0
     
-    base_layer = ne.evaluate("10**base_layer")
-    detail_layer = ne.evaluate("10**detail_layer")
+    # back to linear, in place on the float32 layers
+    np.power(np.float32(10), base_layer, out=base_layer)
+    np.power(np.float32(10), detail_layer, out=detail_layer)
 
     return base_layer, detail_layer
\ No newline at end of file
@@ -28,7 +28,7 @@ def LocalContrast(detail, base):
     k = 1.0 / (5 * La + 1)
     # FL = 0.2 * k ** 4 * (5 * La) + 0.1 * (1 - k ** 4) ** 2 * (5 * La) ** (1 / 3)
     FL = ne.evaluate("0.2 * k ** 4 * (5 * La) + 0.1 * (1 - k ** 4) ** 2 * (5 * La) ** (1 / 3)")
-    FL_rep = np.stack([FL, FL, FL], axis=2)
+    FL_rep = FL[:, :, np.newaxis]  # broadcasts across the three channels
     detail_a = ne.evaluate("detail ** ((FL_rep + 0.8) ** 0.25)")
     return detail_a
 